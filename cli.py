@@ -9,11 +9,14 @@ Usage:
     python cli.py send speed <value>       # Set speed (0-255, higher=slower)
     python cli.py send timer <seconds>     # Set timer in seconds
     python cli.py send pace <M:SS>         # Set speed by pace (e.g. 2:00 for 2:00/100m)
+    python cli.py script <file>            # Send commands from a file (one per line)
 """
 
 import argparse
+import select
 import socket
 import sys
+import time
 
 from protocol import constants as C
 from protocol.decoder import (
@@ -21,7 +24,8 @@ from protocol.decoder import (
     format_pace,
     format_timer,
     pace_to_speed_param,
-    parse_broadcast,
+    parse_broadcast_batch,
+    speed_level_to_pace,
     speed_param_to_pace,
 )
 
@@ -30,6 +34,9 @@ def create_udp_listener() -> socket.socket:
     """Create a UDP socket that listens for broadcast packets on CLIENT_PORT."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        # Allows monitoring while the web server holds the port
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     sock.bind(("", C.CLIENT_PORT))
     sock.settimeout(2.0)
@@ -43,56 +50,97 @@ def create_udp_sender() -> socket.socket:
     return sock
 
 
+# Receive slot per datagram: one byte more than a broadcast, so an oversized
+# datagram shows up as a wrong length instead of being silently truncated.
+_SLOT = C.BC_PACKET_SIZE + 1
+_BACKLOG_SLOTS = 64
+
+
+def drain_queued(sock: socket.socket, view: memoryview) -> list:
+    """Receive the datagrams queued on ``sock`` into consecutive slots of ``view``.
+
+    Usually one packet (plus the pool's duplicate); after a network stall
+    the backlog is picked up here in one pass instead of one loop iteration
+    (and redraw) per packet.  Returns ``(data, addr)`` pairs whose ``data``
+    are views into the buffer, valid until the next call.  Anything left
+    once the buffer is full stays queued for the next call.
+    """
+    queued = []
+    for off in range(0, len(view) - _SLOT + 1, _SLOT):
+        try:
+            nbytes, addr = sock.recvfrom_into(view[off:off + _SLOT], _SLOT, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            break
+        queued.append((view[off:off + nbytes], addr))
+    return queued
+
+
+def print_status(status, count: int, addr) -> None:
+    """Clear the terminal and print a decoded status packet."""
+    print("\033[2J\033[H", end="")  # ANSI clear screen
+    print(f"=== Endless Pool Monitor === (packet #{count} from {addr[0]})")
+    print(f"  Device:       {status.device_name}")
+    print(f"  State:        {'RUNNING' if status.is_running else 'STOPPED'}")
+    print(f"  Speed:        {status.current_speed} / {status.target_speed}"
+          f"  (param: {status.speed_param})")
+
+    if status.current_speed > 1:
+        pace = speed_level_to_pace(status.current_speed)
+        if pace:
+            print(f"  Pace:         ~{format_pace(pace)}/100m")
+
+    print(f"  Timer:        {format_timer(status.remaining_timer)}"
+          f" / {format_timer(status.set_timer)}")
+    print(f"  Seg Distance: {status.segment_distance:.1f} m")
+    print(f"  Tot Distance: {status.total_distance:.1f} m")
+    print(f"  Timestamp:    {status.timestamp}")
+    print("\n  Press Ctrl+C to exit")
+
+
 def monitor(args):
     """Listen for pool broadcasts and display status in real-time."""
     sock = create_udp_listener()
     print(f"Listening for pool broadcasts on UDP port {C.CLIENT_PORT}...")
     print(f"Pool expected at {C.POOL_IP}\n")
 
-    last_raw = None
+    # One receive buffer for the whole session; packets are parsed in place
+    buf = bytearray(_SLOT * _BACKLOG_SLOTS)
+    view = memoryview(buf)
+    last_key = None
     count = 0
 
+    # Wait in select(); the receives themselves never block
+    sock.setblocking(False)
     try:
         while True:
-            try:
-                data, addr = sock.recvfrom(1024)
-            except socket.timeout:
+            if not select.select([sock], [], [], 2.0)[0]:
                 continue
 
-            # Only process packets from pool IP (or any broadcast of right size)
-            if len(data) != C.BC_PACKET_SIZE:
-                continue
+            # Deduplicate (pool sends each packet twice). The trailing
+            # CRC32 identifies a packet, so compare it as an int; a copy of
+            # the last packet shown is dropped before decoding.
+            fresh = []
+            for data, src in drain_queued(sock, view):
+                # Only process packets from pool IP (or any broadcast of right size)
+                if len(data) != C.BC_PACKET_SIZE:
+                    continue
+                key = int.from_bytes(data[C.BC_CRC_OFFSET:], "little")
+                if key != last_key:
+                    fresh.append((data, src, key))
 
-            status = parse_broadcast(data)
-            if status is None:
-                continue
+            # Any backlog is decoded in one batch, but only the newest
+            # packet of the burst is drawn.
+            latest = None
+            statuses = parse_broadcast_batch([data for data, _, _ in fresh])
+            for (_, src, key), status in zip(fresh, statuses):
+                if status is None or key == last_key:
+                    continue
+                last_key = key
+                count += 1
+                latest = (status, src)
 
-            # Deduplicate (pool sends each packet twice)
-            if data == last_raw:
-                continue
-            last_raw = data
-            count += 1
-
-            # Clear screen and print status
-            print("\033[2J\033[H", end="")  # ANSI clear screen
-            print(f"=== Endless Pool Monitor === (packet #{count} from {addr[0]})")
-            print(f"  Device:       {status.device_name}")
-            print(f"  State:        {'RUNNING' if status.is_running else 'STOPPED'}")
-            print(f"  Speed:        {status.current_speed} / {status.target_speed}"
-                  f"  (param: {status.speed_param})")
-
-            if status.current_speed > 1:
-                from protocol.decoder import speed_level_to_pace
-                pace = speed_level_to_pace(status.current_speed)
-                if pace:
-                    print(f"  Pace:         ~{format_pace(pace)}/100m")
-
-            print(f"  Timer:        {format_timer(status.remaining_timer)}"
-                  f" / {format_timer(status.set_timer)}")
-            print(f"  Seg Distance: {status.segment_distance:.1f} m")
-            print(f"  Tot Distance: {status.total_distance:.1f} m")
-            print(f"  Timestamp:    {status.timestamp}")
-            print("\n  Press Ctrl+C to exit")
+            if latest:
+                print_status(latest[0], count, latest[1])
 
     except KeyboardInterrupt:
         print("\nStopped.")
@@ -100,11 +148,21 @@ def monitor(args):
         sock.close()
 
 
-def send_command(args):
-    """Send a command to the pool."""
-    sock = create_udp_sender()
+def _parse_number(value: str, action: str, kind=int):
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"{action} value must be a number, got {value!r}") from None
+
+
+def build_action(action: str, value):
+    """Build the packet for a CLI action. Returns (packet, description).
+
+    Raises ValueError with a user-facing message for a bad action or value.
+    """
+    if action in ("speed", "timer", "pace") and value is None:
+        raise ValueError(f"{action} requires a value")
 
-    action = args.action
     if action == "start":
         cmd = build_command(C.CMD_START)
         desc = "START"
@@ -112,41 +170,98 @@ def send_command(args):
         cmd = build_command(C.CMD_STOP)
         desc = "STOP"
     elif action == "speed":
-        value = int(args.value)
+        value = _parse_number(value, action)
         if not 0 <= value <= 255:
-            print("Error: Speed must be 0-255")
-            sys.exit(1)
+            raise ValueError("Speed must be 0-255")
         cmd = build_command(C.CMD_SET_SPEED, value)
         pace = speed_param_to_pace(value)
         desc = f"SET SPEED {value} (~{format_pace(pace)}/100m)"
     elif action == "timer":
-        value = int(args.value)
+        value = _parse_number(value, action)
         if value <= 0:
-            print("Error: Timer must be positive")
-            sys.exit(1)
+            raise ValueError("Timer must be positive")
         cmd = build_command(C.CMD_SET_TIMER, value)
         desc = f"SET TIMER {format_timer(value)} ({value}s)"
     elif action == "pace":
-        pace_str = args.value
+        pace_str = value
         parts = pace_str.split(":")
-        if len(parts) != 2:
-            print("Error: Pace must be in M:SS format (e.g. 2:00)")
-            sys.exit(1)
+        if len(parts) != 2 or not all(p.isdigit() for p in parts):
+            raise ValueError("Pace must be in M:SS format (e.g. 2:00)")
         pace_sec = int(parts[0]) * 60 + int(parts[1])
         param = pace_to_speed_param(pace_sec)
         cmd = build_command(C.CMD_SET_SPEED, param)
         desc = f"SET PACE {pace_str}/100m (param={param})"
     else:
-        print(f"Unknown action: {action}")
-        sys.exit(1)
+        raise ValueError(f"Unknown action: {action}")
+
+    return cmd, desc
+
 
+def send_packet(sock: socket.socket, cmd, desc: str) -> None:
+    """Send one command packet to the pool and report it."""
     target = (C.POOL_IP, C.POOL_PORT)
     sock.sendto(cmd, target)
     print(f"Sent {desc} to {target[0]}:{target[1]}")
     print(f"  Packet: {cmd.hex()}")
+
+
+def send_command(args):
+    """Send a command to the pool."""
+    try:
+        cmd, desc = build_action(args.action, args.value)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    sock = create_udp_sender()
+    send_packet(sock, cmd, desc)
     sock.close()
 
 
+def run_script(args):
+    """Send a sequence of commands from a file over a single socket.
+
+    One command per line, in the same form as ``send`` (e.g. ``pace 2:00``),
+    plus ``wait <seconds>`` to pause between steps. Blank lines and lines
+    starting with ``#`` are ignored.
+    """
+    with open(args.file) as f:
+        lines = f.read().splitlines()
+
+    # Validate the whole script before sending anything, so a typo further
+    # down can't leave the pool started with no matching stop.
+    steps = []  # (seconds to wait, None) or (packet, description)
+    for lineno, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts or parts[0].startswith("#"):
+            continue
+        action = parts[0]
+        value = parts[1] if len(parts) > 1 else None
+        try:
+            if action == "wait":
+                if value is None:
+                    raise ValueError("wait requires a value")
+                seconds = _parse_number(value, action, float)
+                if seconds < 0:
+                    raise ValueError("wait must not be negative")
+                steps.append((seconds, None))
+            else:
+                steps.append(build_action(action, value))
+        except ValueError as e:
+            sys.exit(f"{args.file}:{lineno}: {e}")
+
+    sock = create_udp_sender()
+    try:
+        for cmd, desc in steps:
+            if desc is None:
+                time.sleep(cmd)
+            else:
+                send_packet(sock, cmd, desc)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        sock.close()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Endless Pool CLI - monitor and control",
@@ -170,15 +285,22 @@ def main():
         help="Value for speed (0-255), timer (seconds), or pace (M:SS)",
     )
 
+    script_parser = sub.add_parser(
+        "script", help="Send commands listed in a file over one socket"
+    )
+    script_parser.add_argument(
+        "file",
+        help="File with one command per line (e.g. 'pace 2:00', 'wait 60')",
+    )
+
     args = parser.parse_args()
 
     if args.command == "monitor":
         monitor(args)
     elif args.command == "send":
-        if args.action in ("speed", "timer", "pace") and args.value is None:
-            print(f"Error: {args.action} requires a value")
-            sys.exit(1)
         send_command(args)
+    elif args.command == "script":
+        run_script(args)
     else:
         parser.print_help()
 
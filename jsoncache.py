@@ -0,0 +1,156 @@
+"""
+JSON file storage shared by the server and the Strava integration.
+
+Parsed files are kept in memory and re-read only when their mtime or size
+changes on disk, so hot paths (users, programs, workouts, tokens, settings)
+don't re-parse JSON on every request.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def dump_json(data: Any) -> bytes:
+    """Serialize data for the on-disk JSON files (indented like before)."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+
+def load_jsonl(data: bytes) -> List[Any]:
+    """Parse a JSONL file, skipping lines that don't decode.
+
+    A line torn by a crash mid-append must not make the whole history
+    unreadable; the next append starts on a fresh line (see write_file).
+    """
+    lines = data.split(b"\n")
+    items = []
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            items.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            if n == len(lines):
+                logger.warning("Skipping partial trailing JSONL line")
+            else:
+                logger.error("Skipping undecodable JSONL line %d", n)
+    return items
+
+
+def dump_jsonl(items: List[Any]) -> bytes:
+    return b"".join(orjson.dumps(item) + b"\n" for item in items)
+
+
+class JsonFileCache:
+    """Parsed JSON files kept in memory until their mtime changes on disk.
+
+    Writes issued from the event loop are handed to a single background
+    writer thread, so they stay ordered but never block the loop. While a
+    path has writes in flight the in-memory copy is authoritative. Calls
+    made off the loop (e.g. from ``asyncio.to_thread``) write synchronously.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Path, tuple] = {}
+        self._pending: Dict[Path, tuple] = {}  # path -> (writes in flight, any failed)
+        self._indexes: Dict[Path, tuple] = {}  # path -> (indexed list, id -> record)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-writer")
+
+    @staticmethod
+    def _key(path: Path) -> tuple:
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self, path: Path, default: Any, loads=orjson.loads) -> Any:
+        if path in self._pending:
+            return self._entries[path][1]
+        try:
+            key = self._key(path)
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return default
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != key:
+            entry = (key, loads(path.read_bytes()))
+            self._entries[path] = entry
+        return entry[1]
+
+    def store(self, path: Path, data: Any, dumps=dump_json):
+        self._submit(path, dumps(data), "wb", data)
+
+    def append_line(self, path: Path, item: Any):
+        """Append one record to a JSONL file and to its cached list."""
+        items = self.load(path, [], load_jsonl)
+        items.append(item)
+        self._submit(path, orjson.dumps(item) + b"\n", "ab", items)
+
+    def index(self, path: Path, items: List[Dict]) -> Dict[Any, Dict]:
+        """Map of record id -> record for a list previously returned by load()."""
+        idx = self._indexes.get(path)
+        if idx is None or idx[0] is not items:
+            idx = (items, {item.get("id"): item for item in items})
+            self._indexes[path] = idx
+        return idx[1]
+
+    def flush(self):
+        """Block until every queued write has reached the file system."""
+        self._writer.submit(lambda: None).result()
+
+    def _submit(self, path: Path, blob: bytes, mode: str, data: Any):
+        self._indexes.pop(path, None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            write_file(path, blob, mode)
+            self._entries[path] = (self._key(path), data)
+            return
+        self._entries[path] = (None, data)
+        count, failed = self._pending.get(path, (0, False))
+        self._pending[path] = (count + 1, failed)
+        fut = self._writer.submit(write_file, path, blob, mode)
+        fut.add_done_callback(lambda f: loop.call_soon_threadsafe(self._written, path, f))
+
+    def _written(self, path: Path, fut):
+        count, failed = self._pending.pop(path)
+        if fut.exception() is not None:
+            logger.error("Failed to write %s: %s", path, fut.exception())
+            failed = True
+        if count > 1:
+            self._pending[path] = (count - 1, failed)
+            return
+        if not failed:
+            try:
+                self._entries[path] = (self._key(path), self._entries[path][1])
+                return
+            except FileNotFoundError:
+                pass
+        # Drop the copy so the next load re-reads whatever is on disk.
+        self._entries.pop(path, None)
+
+
+def write_file(path: Path, blob: bytes, mode: str):
+    if mode == "ab":
+        with path.open("a+b") as f:
+            # Terminate a line left torn by an interrupted append first
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    blob = b"\n" + blob
+            f.write(blob)
+        return
+    # Full rewrites go through a temp file so readers never see a torn file
+    # (named per thread: off-loop callers may write the same path at once).
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+
+
+json_cache = JsonFileCache()
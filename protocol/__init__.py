@@ -1,2 +1,2 @@
 from .constants import *
-from .decoder import PoolStatus, parse_broadcast, build_command, speed_param_to_pace, pace_to_speed_param
+from .decoder import PoolStatus, parse_broadcast, parse_broadcast_batch, build_command, speed_param_to_pace, pace_to_speed_param
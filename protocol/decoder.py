@@ -32,13 +32,38 @@ import binascii
 import random
 import struct
 import time
-from dataclasses import dataclass, asdict
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
 
 from . import constants as C
 
+# Whole-packet broadcast layout, decoded in a single C-level unpack:
+#   2x   magic            6B  state/flags/running/cur/target/param
+#   x    pad              HH  set timer, remaining timer
+#   10x  pad              ff  segment distance, total distance
+#   40x  pad              I   timestamp
+#   4x   pad              13s device name
+#   15x  pad              I   CRC32
+_BC_LAYOUT = struct.Struct("<2x6BxHH10xff40xI4x13s15xI")
+assert _BC_LAYOUT.size == C.BC_PACKET_SIZE
 
-@dataclass
+_MAGIC_HI, _MAGIC_LO = C.MAGIC
+
+# State IDs a genuine broadcast can carry: the echoed command, or 0 before
+# any command has been received since power-on.
+_VALID_STATE_IDS = frozenset(
+    {0x00, C.CMD_START, C.CMD_STOP, C.CMD_SET_SPEED, C.CMD_SET_TIMER}
+)
+
+# Bound once: getrandbits(8) is a single C call, unlike randint(0, 255)
+_getrandbits = random.getrandbits
+
+# Little-endian packers for command fields
+_U16_LE = struct.Struct("<H")
+_U32_LE = struct.Struct("<I")
+
+
+@dataclass(slots=True)
 class PoolStatus:
     """Parsed broadcast packet from the pool."""
     state_id: int
@@ -49,91 +74,138 @@ class PoolStatus:
     speed_param: int
     set_timer: int          # seconds
     remaining_timer: int    # seconds
-    segment_distance: float # meters
-    total_distance: float   # meters
+    segment_distance: float # meters (unrounded float32 — format for display)
+    total_distance: float   # meters (unrounded float32 — format for display)
     timestamp: int          # unix epoch
     device_name: str
     raw: Optional[bytes] = None
+    # Derived once at construction; the status is never mutated afterwards
+    pool_state: str = field(init=False)
+
+    def __post_init__(self):
+        self.pool_state = self._derive_state()
 
     def to_dict(self) -> dict:
         """Convert to JSON-serializable dict (excludes raw bytes)."""
-        d = asdict(self)
-        d.pop("raw", None)
-        d["current_pace"] = speed_level_to_pace(self.current_speed) if self.current_speed > 1 else None
-        d["target_pace"] = speed_level_to_pace(self.target_speed) if self.target_speed > 1 else None
-        # Commanded pace from the speed_param (byte 7) — most reliable
-        d["commanded_pace"] = speed_param_to_pace(self.speed_param) if self.speed_param > 0 else None
-        # Pool state string
-        d["pool_state"] = self._derive_state()
-        return d
+        # Built by hand: asdict() would reflect over the fields and deep-copy
+        # the raw packet only for it to be discarded.
+        return {
+            "state_id": self.state_id,
+            "status_flags": self.status_flags,
+            "is_running": self.is_running,
+            "current_speed": self.current_speed,
+            "target_speed": self.target_speed,
+            "speed_param": self.speed_param,
+            "set_timer": self.set_timer,
+            "remaining_timer": self.remaining_timer,
+            "segment_distance": self.segment_distance,
+            "total_distance": self.total_distance,
+            "timestamp": self.timestamp,
+            "device_name": self.device_name,
+            "current_pace": speed_level_to_pace(self.current_speed) if self.current_speed > 1 else None,
+            "target_pace": speed_level_to_pace(self.target_speed) if self.target_speed > 1 else None,
+            # Commanded pace from the speed_param (byte 7) — most reliable
+            "commanded_pace": speed_param_to_pace(self.speed_param) if self.speed_param > 0 else None,
+            # Pool state string
+            "pool_state": self.pool_state,
+        }
 
     def _derive_state(self) -> str:
         """Derive a human-readable pool state from status_flags + running flag."""
-        flags = self.status_flags
-        running = self.is_running
-        lower = flags & 0x0F
-        transitioning = bool(flags & 0x40)
-
-        if running and not transitioning:
-            return "running"         # 0x0f / 0x21 — steady state
-        if running and transitioning:
-            return "running"         # 0x4f / 0x21 — just reached speed
-        if not running and not transitioning and lower == 0x08:
-            return "idle"            # 0x08 / 0x61 — fully stopped
-        if not running and transitioning:
-            if lower in (0x08,):
-                return "ready"       # 0x48 / 0x61 — settings set, awaiting start
-            if lower in (0x09, 0x0b):
-                return "starting"    # 0x49, 0x4b / 0x61 — ramping up
-            if lower == 0x0a:
-                return "stopping"    # 0x4a / 0x61 — decelerating
-            if lower == 0x0f:
-                return "changing"    # 0x4f / 0x61 — speed change in progress
-        return "idle"
-
-
-def parse_broadcast(data: bytes) -> Optional[PoolStatus]:
-    """Parse a 111-byte broadcast packet from the pool. Returns None if invalid."""
-    if len(data) != C.BC_PACKET_SIZE:
-        return None
-    if data[0:2] != C.MAGIC:
-        return None
+        if self.is_running:
+            return "running"         # 0x0f / 0x4f with 0x21 — steady or just reached speed
+        return _STOPPED_STATES.get(self.status_flags & 0x4F, "idle")
 
-    # Verify CRC32
-    expected_crc = struct.unpack_from("<I", data, C.BC_CRC_OFFSET)[0]
-    actual_crc = binascii.crc32(data[: C.BC_CRC_OFFSET]) & 0xFFFFFFFF
-    if actual_crc != expected_crc:
-        return None
 
-    is_running = (data[C.BC_RUNNING_FLAG_OFFSET] & 0x40) == 0
+# Stopped-pool states keyed by status_flags & 0x4F (transitioning bit 0x40
+# + lower nibble).  Anything not listed reads as "idle".
+_STOPPED_STATES = {
+    0x08: "idle",       # 0x08 / 0x61 — fully stopped
+    0x48: "ready",      # 0x48 / 0x61 — settings set, awaiting start
+    0x49: "starting",   # 0x49 / 0x61 — ramping up
+    0x4B: "starting",   # 0x4b / 0x61 — ramping up
+    0x4A: "stopping",   # 0x4a / 0x61 — decelerating
+    0x4F: "changing",   # 0x4f / 0x61 — speed change in progress
+}
 
-    set_timer = struct.unpack_from("<H", data, C.BC_SET_TIMER_OFFSET)[0]
-    rem_timer = struct.unpack_from("<H", data, C.BC_REM_TIMER_OFFSET)[0]
-    seg_dist = struct.unpack_from("<f", data, C.BC_SEGMENT_DIST_OFFSET)[0]
-    tot_dist = struct.unpack_from("<f", data, C.BC_TOTAL_DIST_OFFSET)[0]
-    timestamp = struct.unpack_from("<I", data, C.BC_TIMESTAMP_OFFSET)[0]
 
-    name_bytes = data[C.BC_DEVICE_NAME_OFFSET : C.BC_DEVICE_NAME_OFFSET + 13]
+def _is_valid_broadcast(data: bytes) -> bool:
+    """Length, magic, state-ID and CRC32 checks for a broadcast packet."""
+    if len(data) != C.BC_PACKET_SIZE:
+        return False
+    # Two direct byte loads — slicing would allocate for every packet
+    if data[0] != _MAGIC_HI or data[1] != _MAGIC_LO:
+        return False
+    # Cheap sanity check so malformed packets skip the CRC pass
+    if data[C.BC_STATE_ID_OFFSET] not in _VALID_STATE_IDS:
+        return False
+
+    # Verify CRC32 (memoryview: checksum the prefix in place, no copy)
+    expected_crc = _U32_LE.unpack_from(data, C.BC_CRC_OFFSET)[0]
+    actual_crc = binascii.crc32(memoryview(data)[: C.BC_CRC_OFFSET]) & 0xFFFFFFFF
+    return actual_crc == expected_crc
+
+
+def _status_from_fields(fields: tuple, raw: Optional[bytes]) -> PoolStatus:
+    """Build a PoolStatus from one ``_BC_LAYOUT`` unpack result."""
+    (state_id, status_flags, running_flag, current_speed, target_speed,
+     speed_param, set_timer, rem_timer, seg_dist, tot_dist, timestamp,
+     name_bytes, _crc) = fields
+
     device_name = name_bytes.split(b"\x00")[0].decode("ascii", errors="replace")
 
     return PoolStatus(
-        state_id=data[C.BC_STATE_ID_OFFSET],
-        status_flags=data[C.BC_STATUS_FLAGS_OFFSET],
-        is_running=is_running,
-        current_speed=data[C.BC_CURRENT_SPEED_OFFSET],
-        target_speed=data[C.BC_TARGET_SPEED_OFFSET],
-        speed_param=data[C.BC_SPEED_PARAM_OFFSET],
+        state_id=state_id,
+        status_flags=status_flags,
+        is_running=(running_flag & 0x40) == 0,
+        current_speed=current_speed,
+        target_speed=target_speed,
+        speed_param=speed_param,
         set_timer=set_timer,
         remaining_timer=rem_timer,
-        segment_distance=round(seg_dist, 2),
-        total_distance=round(tot_dist, 2),
+        segment_distance=seg_dist,
+        total_distance=tot_dist,
         timestamp=timestamp,
         device_name=device_name,
-        raw=data,
+        raw=raw,
     )
 
 
-def build_command(cmd_type: int, param: int = 0) -> bytes:
+def parse_broadcast(data: bytes, keep_raw: bool = False) -> Optional[PoolStatus]:
+    """Parse a 111-byte broadcast packet from the pool. Returns None if invalid.
+
+    The packet bytes are only retained on ``PoolStatus.raw`` when
+    ``keep_raw`` is set, so callers that don't need them don't keep every
+    receive buffer alive.
+    """
+    if not _is_valid_broadcast(data):
+        return None
+    return _status_from_fields(_BC_LAYOUT.unpack(data), data if keep_raw else None)
+
+
+def parse_broadcast_batch(packets: Sequence[bytes],
+                          keep_raw: bool = False) -> List[Optional[PoolStatus]]:
+    """Parse several broadcast packets, e.g. a backlog drained after a stall.
+
+    Each packet is validated on its own, then all valid ones are decoded in a
+    single ``Struct.iter_unpack`` pass over one joined buffer.  The result is
+    aligned with ``packets``; invalid entries are None.
+    """
+    results: List[Optional[PoolStatus]] = [None] * len(packets)
+    valid = [i for i, data in enumerate(packets) if _is_valid_broadcast(data)]
+    joined = b"".join([packets[i] for i in valid])
+    for i, fields in zip(valid, _BC_LAYOUT.iter_unpack(joined)):
+        results[i] = _status_from_fields(fields, packets[i] if keep_raw else None)
+    return results
+
+
+# Command template: magic + trailing constant pre-filled, bytes 6-31 stay zero.
+_CMD_TEMPLATE = bytearray(C.CMD_PACKET_SIZE)
+_CMD_TEMPLATE[0:2] = C.MAGIC
+_U32_LE.pack_into(_CMD_TEMPLATE, C.CMD_CONSTANT_OFFSET, C.CMD_CONSTANT_VALUE)
+
+
+def build_command(cmd_type: int, param: int = 0) -> bytearray:
     """
     Build a 44-byte command packet.
 
@@ -142,35 +214,30 @@ def build_command(cmd_type: int, param: int = 0) -> bytes:
         param: Parameter value (timer in seconds, or pace in seconds/100m for speed)
 
     Returns:
-        44-byte command packet ready to send via UDP.
+        44-byte command packet ready to send via UDP.  Returned as the
+        bytearray it was built in — sockets accept any buffer, so no
+        final bytes copy is made.
     """
-    buf = bytearray(C.CMD_PACKET_SIZE)
-
-    # Magic header
-    buf[0:2] = C.MAGIC
+    # Magic header, zero padding and constant come from the template
+    buf = _CMD_TEMPLATE[:]
 
     # Transaction ID (random byte, pool echoes it in broadcasts)
-    buf[2] = random.randint(0, 255)
+    buf[2] = _getrandbits(8)
 
     # Command type
     buf[3] = cmd_type
 
     # Parameter (LE uint16)
-    struct.pack_into("<H", buf, 4, param & 0xFFFF)
-
-    # Bytes 6-31: zeros (already zero from bytearray)
+    _U16_LE.pack_into(buf, 4, param & 0xFFFF)
 
     # Timestamp
-    struct.pack_into("<I", buf, C.CMD_TIMESTAMP_OFFSET, int(time.time()))
+    _U32_LE.pack_into(buf, C.CMD_TIMESTAMP_OFFSET, int(time.time()))
 
-    # Constant
-    struct.pack_into("<I", buf, C.CMD_CONSTANT_OFFSET, C.CMD_CONSTANT_VALUE)
+    # CRC32 of bytes 0-39 (memoryview avoids copying the prefix)
+    crc = binascii.crc32(memoryview(buf)[: C.CMD_CRC_OFFSET]) & 0xFFFFFFFF
+    _U32_LE.pack_into(buf, C.CMD_CRC_OFFSET, crc)
 
-    # CRC32 of bytes 0-39
-    crc = binascii.crc32(bytes(buf[: C.CMD_CRC_OFFSET])) & 0xFFFFFFFF
-    struct.pack_into("<I", buf, C.CMD_CRC_OFFSET, crc)
-
-    return bytes(buf)
+    return buf
 
 
 # ---------------------------------------------------------------------------
@@ -194,6 +261,41 @@ def pace_to_speed_param(pace_sec: float) -> int:
     return max(C.PACE_FASTEST_SEC, min(C.PACE_SLOWEST_SEC, int(round(pace_sec))))
 
 
+# Motor level → pace calibration (from pcap + manufacturer app)
+_LEVEL_PACE_CAL = [
+    (40, 243.0), (45, 219.0), (51, 194.0), (61, 162.0),
+    (67, 148.0), (77, 129.0), (91, 109.0), (180, 74.0),
+]
+
+
+def _interpolate_level_pace(level: int) -> Optional[float]:
+    """Piecewise-linear pace estimate for a motor level (extrapolates at ends)."""
+    cal = _LEVEL_PACE_CAL
+
+    if level <= cal[0][0]:
+        slope = (cal[1][1] - cal[0][1]) / (cal[1][0] - cal[0][0])
+        return cal[0][1] + slope * (level - cal[0][0])
+    if level >= cal[-1][0]:
+        slope = (cal[-1][1] - cal[-2][1]) / (cal[-1][0] - cal[-2][0])
+        return cal[-1][1] + slope * (level - cal[-1][0])
+
+    for i in range(len(cal) - 1):
+        l1, p1 = cal[i]
+        l2, p2 = cal[i + 1]
+        if l1 <= level <= l2:
+            t = (level - l1) / (l2 - l1) if l2 != l1 else 0
+            return p1 + t * (p2 - p1)
+
+    return None
+
+
+# Levels are a single byte, so every possible value is precomputed once.
+# Index 0/1 mean "motor off" and map to None.
+_LEVEL_TO_PACE = (None, None) + tuple(
+    _interpolate_level_pace(level) for level in range(2, 256)
+)
+
+
 def speed_level_to_pace(level: int) -> Optional[float]:
     """
     Estimate pace from the internal motor speed level (bytes 5/6).
@@ -211,27 +313,9 @@ def speed_level_to_pace(level: int) -> Optional[float]:
     """
     if level <= 1:
         return None
-
-    cal = [
-        (40, 243.0), (45, 219.0), (51, 194.0), (61, 162.0),
-        (67, 148.0), (77, 129.0), (91, 109.0), (180, 74.0),
-    ]
-
-    if level <= cal[0][0]:
-        slope = (cal[1][1] - cal[0][1]) / (cal[1][0] - cal[0][0])
-        return round(cal[0][1] + slope * (level - cal[0][0]), 1)
-    if level >= cal[-1][0]:
-        slope = (cal[-1][1] - cal[-2][1]) / (cal[-1][0] - cal[-2][0])
-        return round(cal[-1][1] + slope * (level - cal[-1][0]), 1)
-
-    for i in range(len(cal) - 1):
-        l1, p1 = cal[i]
-        l2, p2 = cal[i + 1]
-        if l1 <= level <= l2:
-            t = (level - l1) / (l2 - l1) if l2 != l1 else 0
-            return round(p1 + t * (p2 - p1), 1)
-
-    return None
+    if level < len(_LEVEL_TO_PACE):
+        return _LEVEL_TO_PACE[level]
+    return _interpolate_level_pace(level)
 
 
 def format_pace(seconds_per_100m: float) -> str:
@@ -13,23 +13,26 @@ Handles:
 
 import asyncio
 import hashlib
-import json
+import hmac
+import logging
 import os
+import re
 import socket
-import threading
 import time
 import uuid
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastapi import (
     FastAPI, WebSocket, WebSocketDisconnect,
     HTTPException, Request,
 )
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+import orjson
 
 from protocol import constants as C
 from protocol.decoder import (
@@ -38,12 +41,15 @@ from protocol.decoder import (
     format_timer,
     parse_broadcast,
 )
+from jsoncache import dump_json, dump_jsonl, json_cache, load_jsonl, write_file
 import strava as strava_module
 import tcx as tcx_module
 
 # ---------------------------------------------------------------------------
 # Data paths
 # ---------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+
 DATA_DIR = Path(os.environ.get("ENDLESSPOOL_DATA_DIR", "data"))
 USERS_FILE = DATA_DIR / "users.json"
 
@@ -56,14 +62,12 @@ def ensure_dirs():
     if not USERS_FILE.exists():
         USERS_FILE.write_text("[]")
 
-# ---------------------------------------------------------------------------
-# Global state
-# ---------------------------------------------------------------------------
-latest_status: Optional[Dict[str, Any]] = None
-connected_websockets: List[WebSocket] = []
-udp_listener_sock: Optional[socket.socket] = None
-udp_sender_sock: Optional[socket.socket] = None
-workout_recorder = None  # WorkoutRecorder instance
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson instead of the stdlib encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
 
 # ---------------------------------------------------------------------------
 # Calorie estimation
@@ -113,18 +117,23 @@ def estimate_calories(duration_sec: int, pace_sec: int, weight_kg: float = 75.0)
 class WorkoutRecorder:
     """Automatically records workouts when the pool is running.
 
-    Thread-safety: all public methods acquire ``_lock`` because
-    ``update()`` is called from the UDP-listener thread while
-    ``finalize()`` can be called from WebSocket command threads.
+    All methods run on the event loop (UDP protocol callbacks and
+    WebSocket handlers/command tasks), so no locking is needed.
     """
 
     def __init__(self):
-        self._lock = threading.Lock()
         self.active_user_id: Optional[str] = None
         self.recording = False
         self.workout: Optional[Dict] = None
         self.current_interval_start: Optional[float] = None
+        self.current_interval_start_iso: str = ""
         self.current_interval_dist_start: float = 0.0
+        # Unrounded running total; rounded once in finalize()
+        self.total_distance: float = 0.0
+        self.weight_kg: float = 75.0
+        # Active user's weight, read when the user is selected so that
+        # starting a workout (a UDP callback) never touches the disk.
+        self.user_weight_kg: float = 75.0
         self.last_speed_param: int = 0
         # Use pool_state (derived from status_flags + running_flag) instead
         # of raw is_running so that transient speed-change pauses don't
@@ -132,37 +141,36 @@ class WorkoutRecorder:
         self.last_pool_state: str = "idle"
         self.stopped_at: Optional[float] = None
 
-    def set_user(self, user_id: str):
-        with self._lock:
-            self.active_user_id = user_id
+    def set_user(self, user_id: str, weight_kg: float = 75.0):
+        self.active_user_id = user_id
+        self.user_weight_kg = weight_kg
 
     def update(self, status: PoolStatus):
         """Called on each broadcast packet. Manages recording state."""
         now = time.time()
-        state = status._derive_state()
-
-        with self._lock:
-            prev = self.last_pool_state
-            self.last_pool_state = state
-
-            # Determine logical running: pool is truly active when state
-            # is running OR briefly transitioning during a speed change.
-            truly_running = state in ("running", "changing", "starting")
-            was_truly_running = prev in ("running", "changing", "starting")
-
-            if truly_running and not was_truly_running:
-                self._on_start(status, now)
-                self.stopped_at = None
-            elif not truly_running and was_truly_running:
-                self._on_stop(status, now)
-                self.stopped_at = now
-            elif truly_running and self.recording:
-                self.stopped_at = None
-                # Speed change mid-swim → new interval
-                if (status.speed_param != self.last_speed_param
-                        and self.last_speed_param != 0):
-                    self._finish_interval(status, now)
-                    self._start_interval(status, now)
+        state = status.pool_state
+
+        prev = self.last_pool_state
+        self.last_pool_state = state
+
+        # Determine logical running: pool is truly active when state
+        # is running OR briefly transitioning during a speed change.
+        truly_running = state in ("running", "changing", "starting")
+        was_truly_running = prev in ("running", "changing", "starting")
+
+        if truly_running and not was_truly_running:
+            self._on_start(status, now)
+            self.stopped_at = None
+        elif not truly_running and was_truly_running:
+            self._on_stop(status, now)
+            self.stopped_at = now
+        elif truly_running and self.recording:
+            self.stopped_at = None
+            # Speed change mid-swim → new interval
+            if (status.speed_param != self.last_speed_param
+                    and self.last_speed_param != 0):
+                self._finish_interval(status, now)
+                self._start_interval(status, now)
 
     def check_auto_finalize(self) -> Optional[Dict]:
         """Auto-finalize when pool has truly stopped while recording.
@@ -171,15 +179,14 @@ class WorkoutRecorder:
           user stopped via other app).
         - 5-second safety net for any other non-running state.
         """
-        with self._lock:
-            if not self.recording or self.stopped_at is None:
-                return None
-            elapsed = time.time() - self.stopped_at
-            if self.last_pool_state == "idle" and elapsed > 1.0:
-                return self._finalize_locked()
-            if elapsed > 5.0:
-                return self._finalize_locked()
+        if not self.recording or self.stopped_at is None:
             return None
+        elapsed = time.time() - self.stopped_at
+        if self.last_pool_state == "idle" and elapsed > 1.0:
+            return self.finalize()
+        if elapsed > 5.0:
+            return self.finalize()
+        return None
 
     def set_program_meta(self, icon: str = "", name: str = ""):
         """Set program metadata to be attached to the next workout."""
@@ -202,11 +209,16 @@ class WorkoutRecorder:
                 "icon": getattr(self, "pending_icon", ""),
                 "program_name": getattr(self, "pending_program_name", ""),
             }
+            self.total_distance = 0.0
+            self.weight_kg = self.user_weight_kg
             self.recording = True
         self._start_interval(status, now)
 
     def _start_interval(self, status: PoolStatus, now: float):
         self.current_interval_start = now
+        self.current_interval_start_iso = datetime.fromtimestamp(
+            now, tz=timezone.utc
+        ).isoformat()
         self.current_interval_dist_start = status.total_distance
         self.last_speed_param = status.speed_param
 
@@ -224,15 +236,9 @@ class WorkoutRecorder:
         )
 
         if duration > 0:
-            weight = 75.0
-            if self.active_user_id:
-                us = strava_module.load_user_settings(self.active_user_id)
-                weight = us.get("weight_kg", 75.0)
-            cals = estimate_calories(duration, self.last_speed_param, weight)
+            cals = estimate_calories(duration, self.last_speed_param, self.weight_kg)
             interval = {
-                "start_time": datetime.fromtimestamp(
-                    self.current_interval_start, tz=timezone.utc
-                ).isoformat(),
+                "start_time": self.current_interval_start_iso,
                 "duration": duration,
                 "distance": round(distance, 1),
                 "speed_param": self.last_speed_param,
@@ -244,20 +250,13 @@ class WorkoutRecorder:
                 "type": "swim",
             }
             self.workout["intervals"].append(interval)
-            self.workout["total_distance"] = round(
-                self.workout["total_distance"] + distance, 1
-            )
+            self.total_distance += distance
             self.workout["total_time"] += duration
 
         self.current_interval_start = None
 
     def finalize(self) -> Optional[Dict]:
         """Finish recording and return the workout, or None."""
-        with self._lock:
-            return self._finalize_locked()
-
-    def _finalize_locked(self) -> Optional[Dict]:
-        """Inner finalize — caller must hold ``_lock``."""
         if not self.recording or not self.workout:
             return None
         if not self.workout["intervals"]:
@@ -266,6 +265,7 @@ class WorkoutRecorder:
             return None
 
         workout = self.workout
+        workout["total_distance"] = round(self.total_distance, 1)
         workout["total_calories"] = sum(
             iv.get("calories", 0) for iv in workout["intervals"]
         )
@@ -280,77 +280,141 @@ class WorkoutRecorder:
 
 
 # ---------------------------------------------------------------------------
-# UDP threads
+# Shared state
 # ---------------------------------------------------------------------------
-def udp_listener_thread():
-    """Background thread: listen for pool broadcasts and update state."""
-    global latest_status, udp_listener_sock
+@dataclass
+class AppState:
+    """State shared by the UDP protocol, WebSocket handlers and command tasks.
+
+    One instance lives on ``app.state.pool`` for the lifetime of the app.
+    Everything that touches it runs on the event loop.
+    """
 
+    recorder: WorkoutRecorder = field(default_factory=WorkoutRecorder)
+    latest_status: Optional[Dict[str, Any]] = None
+    # The status WebSocket message, encoded once whenever it changes
+    latest_status_payload: Optional[str] = None
+    # Each connected client's bounded outbound queue of encoded messages
+    clients: Dict[WebSocket, asyncio.Queue] = field(default_factory=dict)
+    listener: Optional[asyncio.DatagramTransport] = None
+    sender_sock: Optional[socket.socket] = None
+    # Command tasks outlive the WebSocket that started them; keep strong
+    # references so they aren't garbage-collected mid-flight.
+    command_tasks: Set[asyncio.Task] = field(default_factory=set)
+
+    def publish_status(self):
+        """Re-encode the status message after the status or recording flag changes.
+
+        Readers only ever see a complete payload: the new string is swapped
+        in with a single assignment.
+        """
+        if self.latest_status is None:
+            return
+        msg = {
+            "type": "status",
+            "data": self.latest_status,
+            "recording": self.recorder.is_recording(),
+        }
+        self.latest_status_payload = orjson.dumps(msg).decode()
+
+    def spawn(self, coro):
+        """Run a command coroutine in the background on the event loop."""
+        task = asyncio.create_task(coro)
+        self.command_tasks.add(task)
+        task.add_done_callback(self.command_tasks.discard)
+
+
+# ---------------------------------------------------------------------------
+# UDP
+# ---------------------------------------------------------------------------
+def create_udp_listener() -> socket.socket:
+    """Create the socket that receives pool broadcasts on CLIENT_PORT."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        # Lets the CLI monitor (or another worker) bind the port alongside us
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    # Room for bursts while the loop is busy (e.g. serializing an export)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
     sock.bind(("", C.CLIENT_PORT))
-    sock.settimeout(1.0)
-    udp_listener_sock = sock
+    return sock
 
-    last_raw = None
 
-    while True:
-        try:
-            data, addr = sock.recvfrom(1024)
-        except socket.timeout:
-            continue
-        except OSError:
-            break
+class PoolBroadcastProtocol(asyncio.DatagramProtocol):
+    """Receives pool broadcasts on the event loop and updates state.
+
+    Runs inside the loop, so status updates no longer cross a thread
+    boundary and shutdown doesn't wait on a receive timeout.
+    """
 
+    def __init__(self, state: AppState):
+        self.state = state
+        self.last_key: int = -1
+
+    def datagram_received(self, data: bytes, addr):
         if len(data) != C.BC_PACKET_SIZE:
-            continue
+            return
+
+        # Deduplicate on the trailing CRC32 before doing any parsing; the
+        # pool repeats each status packet several times.
+        key = int.from_bytes(data[C.BC_CRC_OFFSET:], "little")
+        if key == self.last_key:
+            return
 
         status = parse_broadcast(data)
         if status is None:
-            continue
-
-        # Deduplicate
-        if data == last_raw:
-            continue
-        last_raw = data
+            return
+        self.last_key = key
 
-        latest_status = status.to_dict()
+        state = self.state
+        state.latest_status = status.to_dict()
 
         # Update workout recorder
-        if workout_recorder:
-            workout_recorder.update(status)
-            auto_workout = workout_recorder.check_auto_finalize()
-            if auto_workout:
-                _save_workout(auto_workout)
+        recorder = state.recorder
+        recorder.update(status)
+        auto_workout = recorder.check_auto_finalize()
+        if auto_workout:
+            _save_workout(auto_workout)
 
+        state.publish_status()
 
-def _ensure_sender_sock():
-    """Lazily create the UDP sender socket."""
-    global udp_sender_sock
-    if udp_sender_sock is None:
-        udp_sender_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_sender_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+def create_udp_sender() -> socket.socket:
+    """UDP socket connected to the pool, so sends skip the per-datagram route lookup."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 256 * 1024)
+    sock.connect((C.POOL_IP, C.POOL_PORT))
+    return sock
 
 
-def send_pool_command(cmd_type: int, param: int = 0, repeat: int = 3):
+async def send_pool_command(state: AppState, cmd_type: int, param: int = 0, repeat: int = 3):
     """Send a UDP command to the pool, repeated for reliability.
 
     The packet is built once so every retry carries the same
     transaction-ID; the pool can safely deduplicate.
     """
-    _ensure_sender_sock()
+    if state.sender_sock is None:
+        state.sender_sock = create_udp_sender()
+    sock = state.sender_sock
     cmd = build_command(cmd_type, param)
     for _ in range(repeat):
-        udp_sender_sock.sendto(cmd, (C.POOL_IP, C.POOL_PORT))
+        try:
+            sock.send(cmd)
+        except ConnectionRefusedError:
+            # ICMP port-unreachable from an earlier datagram (pool rebooting)
+            pass
         if repeat > 1:
-            time.sleep(0.05)
+            await asyncio.sleep(0.05)
 
 
-def _send_verified(cmd_type: int, param: int, check_fn, timeout: float = 5.0):
+async def _send_verified(state: AppState, cmd_type: int, param: int, check_fn,
+                         timeout: float = 5.0):
     """Send a command and retry until the broadcast confirms success.
 
     Args:
+        state:    Shared app state (sender socket, latest status).
         cmd_type: Command constant (CMD_START, CMD_STOP, etc.)
         param:    Command parameter.
         check_fn: Callable(latest_status_dict) -> bool that returns True
@@ -359,43 +423,58 @@ def _send_verified(cmd_type: int, param: int, check_fn, timeout: float = 5.0):
     """
     deadline = time.time() + timeout
     while time.time() < deadline:
-        send_pool_command(cmd_type, param, repeat=2)
-        time.sleep(0.6)  # one broadcast cycle (~500ms + margin)
-        if latest_status and check_fn(latest_status):
+        await send_pool_command(state, cmd_type, param, repeat=2)
+        await asyncio.sleep(0.6)  # one broadcast cycle (~500ms + margin)
+        if state.latest_status and check_fn(state.latest_status):
             return
     # Final burst
-    send_pool_command(cmd_type, param, repeat=3)
+    await send_pool_command(state, cmd_type, param, repeat=3)
 
 
-def _send_start_verified():
-    _send_verified(C.CMD_START, 0,
-                   lambda s: s.get("pool_state") not in ("idle", "ready"))
+async def _send_start_verified(state: AppState):
+    await _send_verified(state, C.CMD_START, 0,
+                         lambda s: s.get("pool_state") not in ("idle", "ready"))
 
 
-def _send_stop_verified():
-    _send_verified(C.CMD_STOP, 0,
-                   lambda s: s.get("pool_state") in ("idle", "stopping"))
+async def _send_stop_verified(state: AppState):
+    await _send_verified(state, C.CMD_STOP, 0,
+                         lambda s: s.get("pool_state") in ("idle", "stopping"))
 
 
-def _send_speed_verified(target_pace: int):
-    _send_verified(C.CMD_SET_SPEED, target_pace,
-                   lambda s: s.get("speed_param") == target_pace)
+async def _send_speed_verified(state: AppState, target_pace: int):
+    await _send_verified(state, C.CMD_SET_SPEED, target_pace,
+                         lambda s: s.get("speed_param") == target_pace)
 
 
-def _send_timer_verified(seconds: int):
-    _send_verified(C.CMD_SET_TIMER, seconds,
-                   lambda s: s.get("set_timer") == seconds)
+async def _send_timer_verified(state: AppState, seconds: int):
+    await _send_verified(state, C.CMD_SET_TIMER, seconds,
+                         lambda s: s.get("set_timer") == seconds)
 
 
-def _send_program_step(pace: int, duration: int):
+async def _send_program_step(state: AppState, pace: int, duration: int):
     """Set speed, timer, then start — sequenced with verification.
 
     Used by the program runner to guarantee commands are applied
     in order before the pool starts.
     """
-    _send_speed_verified(pace)
-    _send_timer_verified(duration)
-    _send_start_verified()
+    await _send_speed_verified(state, pace)
+    await _send_timer_verified(state, duration)
+    await _send_start_verified(state)
+
+
+async def _stop_and_finalize(state: AppState):
+    """Stop the pool, then save the workout being recorded (if any)."""
+    await _send_stop_verified(state)
+    _finish_workout(state)
+
+
+def _finish_workout(state: AppState):
+    """Finalize and save the workout being recorded (if any)."""
+    if state.recorder.is_recording():
+        workout = state.recorder.finalize()
+        if workout:
+            _save_workout(workout)
+        state.publish_status()
 
 
 # ---------------------------------------------------------------------------
@@ -403,37 +482,55 @@ def _send_program_step(pace: int, duration: int):
 # ---------------------------------------------------------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global workout_recorder
     ensure_dirs()
-    workout_recorder = WorkoutRecorder()
+    state = app.state.pool = AppState()
+
+    try:
+        state.sender_sock = create_udp_sender()
+    except OSError as e:
+        # No route to the pool yet; the first command retries.
+        logger.warning("Could not open pool command socket: %s", e)
+
+    # Receive pool broadcasts on the event loop
+    loop = asyncio.get_running_loop()
+    state.listener, _ = await loop.create_datagram_endpoint(
+        lambda: PoolBroadcastProtocol(state), sock=create_udp_listener(),
+    )
 
-    # Start UDP listener in background thread
-    listener = threading.Thread(target=udp_listener_thread, daemon=True)
-    listener.start()
+    broadcaster = asyncio.create_task(_status_broadcaster(state))
+    strava_module.resume_pending_uploads()
 
     yield
 
     # Cleanup
-    if udp_listener_sock:
-        udp_listener_sock.close()
-    if udp_sender_sock:
-        udp_sender_sock.close()
-
-
-app = FastAPI(title="Endless Pool Controller", lifespan=lifespan)
+    broadcaster.cancel()
+    state.listener.close()
+    if state.sender_sock:
+        state.sender_sock.close()
+    await strava_module.aclose_client()
+    json_cache.flush()
+
+
+app = FastAPI(
+    title="Endless Pool Controller",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # ---------------------------------------------------------------------------
 # WebSocket
 # ---------------------------------------------------------------------------
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
+    state: AppState = ws.app.state.pool
     await ws.accept()
-    connected_websockets.append(ws)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+    state.clients[ws] = queue
 
     # Send status updates and handle commands
     try:
-        send_task = asyncio.create_task(_ws_send_status(ws))
-        recv_task = asyncio.create_task(_ws_receive_commands(ws))
+        send_task = asyncio.create_task(_ws_relay(ws, queue))
+        recv_task = asyncio.create_task(_ws_receive_commands(ws, state))
         done, pending = await asyncio.wait(
             [send_task, recv_task], return_when=asyncio.FIRST_COMPLETED
         )
@@ -442,27 +539,66 @@ async def websocket_endpoint(ws: WebSocket):
     except WebSocketDisconnect:
         pass
     finally:
-        if ws in connected_websockets:
-            connected_websockets.remove(ws)
+        state.clients.pop(ws, None)
 
 
-async def _ws_send_status(ws: WebSocket):
-    """Push pool status to the WebSocket client every 500ms."""
+async def _status_broadcaster(state: AppState):
+    """Push pool status to every WebSocket client every 500ms.
+
+    The message is pre-encoded by ``AppState.publish_status`` and offered to
+    each client's queue, so a slow client only delays (and drops) its own
+    frames.
+    """
+    clients = state.clients
     while True:
-        if latest_status:
-            try:
-                msg = {
-                    "type": "status",
-                    "data": latest_status,
-                    "recording": workout_recorder.is_recording() if workout_recorder else False,
-                }
-                await ws.send_json(msg)
-            except Exception:
-                break
+        payload = state.latest_status_payload
+        if payload and clients:
+            for queue in clients.values():
+                _offer(queue, payload)
         await asyncio.sleep(0.5)
 
 
-async def _ws_receive_commands(ws: WebSocket):
+def _offer(queue: asyncio.Queue, payload: str):
+    """Enqueue without blocking, dropping the oldest frame when full."""
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        queue.get_nowait()
+        queue.put_nowait(payload)
+
+
+# Prefix of the payloads built by AppState.publish_status
+_STATUS_PREFIX = '{"type":"status"'
+
+
+async def _ws_relay(ws: WebSocket, queue: asyncio.Queue):
+    """Forward one client's queued messages to its WebSocket.
+
+    Of the status frames that piled up while the previous send was in
+    flight only the newest is sent, since each supersedes the last; any
+    other messages are forwarded in order.
+    """
+    while True:
+        pending = [await queue.get()]
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        if len(pending) > 1:
+            last_status = max(
+                (i for i, p in enumerate(pending) if p.startswith(_STATUS_PREFIX)),
+                default=-1,
+            )
+            pending = [
+                p for i, p in enumerate(pending)
+                if i == last_status or not p.startswith(_STATUS_PREFIX)
+            ]
+        try:
+            for payload in pending:
+                await ws.send_text(payload)
+        except Exception:
+            break
+
+
+async def _ws_receive_commands(ws: WebSocket, state: AppState):
     """Receive and execute commands from the WebSocket client."""
     while True:
         try:
@@ -475,71 +611,59 @@ async def _ws_receive_commands(ws: WebSocket):
             cmd = msg.get("cmd")
             value = msg.get("value", 0)
             if cmd == "start":
-                threading.Thread(
-                    target=_send_start_verified, daemon=True
-                ).start()
+                state.spawn(_send_start_verified(state))
             elif cmd == "stop":
-                def _stop_and_finalize():
-                    _send_stop_verified()
-                    if workout_recorder and workout_recorder.is_recording():
-                        workout = workout_recorder.finalize()
-                        if workout:
-                            _save_workout(workout)
-                threading.Thread(
-                    target=_stop_and_finalize, daemon=True
-                ).start()
+                state.spawn(_stop_and_finalize(state))
             elif cmd == "speed":
-                threading.Thread(
-                    target=_send_speed_verified,
-                    args=(int(value),),
-                    daemon=True,
-                ).start()
+                state.spawn(_send_speed_verified(state, int(value)))
             elif cmd == "timer":
-                threading.Thread(
-                    target=_send_timer_verified,
-                    args=(int(value),),
-                    daemon=True,
-                ).start()
+                state.spawn(_send_timer_verified(state, int(value)))
             elif cmd == "program_step":
                 pace = int(msg.get("pace", 120))
                 duration = int(msg.get("duration", 300))
-                threading.Thread(
-                    target=_send_program_step,
-                    args=(pace, duration),
-                    daemon=True,
-                ).start()
+                state.spawn(_send_program_step(state, pace, duration))
             elif cmd == "set_program_meta":
-                if workout_recorder:
-                    workout_recorder.set_program_meta(
-                        icon=msg.get("icon", ""),
-                        name=msg.get("name", ""),
-                    )
+                state.recorder.set_program_meta(
+                    icon=msg.get("icon", ""),
+                    name=msg.get("name", ""),
+                )
         elif msg_type == "set_user":
             user_id = msg.get("user_id")
-            if workout_recorder and user_id:
-                workout_recorder.set_user(user_id)
+            if user_id:
+                settings = await strava_module.aload_user_settings(user_id)
+                state.recorder.set_user(user_id, settings.get("weight_kg", 75.0))
         elif msg_type == "finish_workout":
-            if workout_recorder and workout_recorder.is_recording():
-                workout = workout_recorder.finalize()
-                if workout:
-                    _save_workout(workout)
+            _finish_workout(state)
 
 
 # ---------------------------------------------------------------------------
 # User management helpers
 # ---------------------------------------------------------------------------
 def _load_users() -> List[Dict]:
-    if not USERS_FILE.exists():
-        return []
-    with open(USERS_FILE) as f:
-        return json.load(f)
+    return json_cache.load(USERS_FILE, [])
 
 def _save_users(users: List[Dict]):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    json_cache.store(USERS_FILE, users)
+
+def _get_user(user_id: str) -> Optional[Dict]:
+    return json_cache.index(USERS_FILE, _load_users()).get(user_id)
 
-def _hash_pin(pin: str) -> str:
-    return hashlib.sha256(pin.encode()).hexdigest()
+def _hash_pin(pin: str, salt: bytes) -> str:
+    return hashlib.scrypt(pin.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32).hex()
+
+def _check_pin(pin_hash: str, pin_salt: Optional[str],
+               pin: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Constant-time PIN check. Returns (ok, new_salt, new_hash), where the last
+    two are an scrypt upgrade of a correct legacy unsalted SHA-256 hash.
+    Pure, so it can run in a worker thread without touching cached users.
+    """
+    if pin_salt:
+        return hmac.compare_digest(pin_hash, _hash_pin(pin, bytes.fromhex(pin_salt))), None, None
+    if not hmac.compare_digest(pin_hash, hashlib.sha256(pin.encode()).hexdigest()):
+        return False, None, None
+    new_salt = os.urandom(16)
+    return True, new_salt.hex(), _hash_pin(pin, new_salt)
 
 # ---------------------------------------------------------------------------
 # User REST endpoints
@@ -560,6 +684,11 @@ async def create_user(request: Request):
     if not pin or len(pin) != 4 or not pin.isdigit():
         raise HTTPException(400, "PIN must be 4 digits")
 
+    # Hash first: nothing may await between the duplicate check and the
+    # append, or two concurrent requests could both claim the same name.
+    salt = os.urandom(16)
+    pin_hash = await asyncio.to_thread(_hash_pin, pin, salt)
+
     users = _load_users()
     if any(u["name"].lower() == name.lower() for u in users):
         raise HTTPException(409, "User name already exists")
@@ -568,7 +697,8 @@ async def create_user(request: Request):
     user = {
         "id": user_id,
         "name": name,
-        "pin_hash": _hash_pin(pin),
+        "pin_hash": pin_hash,
+        "pin_salt": salt.hex(),
         "created": datetime.now(timezone.utc).isoformat(),
     }
     users.append(user)
@@ -577,9 +707,9 @@ async def create_user(request: Request):
     # Create user data directory with defaults
     udir = user_dir(user_id)
     udir.mkdir(parents=True, exist_ok=True)
-    (udir / "programs.json").write_text(json.dumps(_default_programs(), indent=2))
-    (udir / "workouts.json").write_text("[]")
-    (udir / "settings.json").write_text("{}")
+    (udir / "programs.json").write_bytes(_DEFAULT_PROGRAMS_JSON)
+    (udir / "workouts.jsonl").write_bytes(b"")
+    (udir / "settings.json").write_bytes(b"{}")
 
     return {"id": user_id, "name": name}
 
@@ -588,39 +718,62 @@ async def login_user(user_id: str, request: Request):
     body = await request.json()
     pin = body.get("pin", "")
 
-    users = _load_users()
-    user = next((u for u in users if u["id"] == user_id), None)
+    user = _get_user(user_id)
     if not user:
         raise HTTPException(404, "User not found")
 
-    if user["pin_hash"] != _hash_pin(pin):
+    old_hash = user["pin_hash"]
+    ok, new_salt, new_hash = await asyncio.to_thread(
+        _check_pin, old_hash, user.get("pin_salt"), pin,
+    )
+    if not ok:
         raise HTTPException(401, "Invalid PIN")
+    if new_hash:
+        # Upgrade on the event loop, and only if no concurrent login already did
+        user = _get_user(user_id) or user
+        if "pin_salt" not in user and user["pin_hash"] == old_hash:
+            user["pin_salt"] = new_salt
+            user["pin_hash"] = new_hash
+            _save_users(_load_users())
 
     return {"id": user["id"], "name": user["name"]}
 
 @app.delete("/api/users/{user_id}")
 async def delete_user(user_id: str):
-    users = _load_users()
-    users = [u for u in users if u["id"] != user_id]
-    _save_users(users)
+    user = _get_user(user_id)
+    if user:
+        users = _load_users()
+        users.remove(user)
+        _save_users(users)
 
     import shutil
     udir = user_dir(user_id)
     if udir.exists():
         shutil.rmtree(udir)
+    strava_module.drop_cached_tokens(user_id)
 
     return {"ok": True}
 
 # ---------------------------------------------------------------------------
 # Programs endpoints
 # ---------------------------------------------------------------------------
+def _programs_path(user_id: str) -> Path:
+    return user_dir(user_id) / "programs.json"
+
+def _load_programs(user_id: str) -> Optional[List[Dict]]:
+    """Parsed programs.json, or None if the user has none on disk."""
+    return json_cache.load(_programs_path(user_id), None)
+
+def _save_programs(user_id: str, programs: List[Dict]):
+    path = _programs_path(user_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_cache.store(path, programs)
+
 @app.get("/api/users/{user_id}/programs")
 async def get_programs(user_id: str):
-    path = user_dir(user_id) / "programs.json"
-    if not path.exists():
+    programs = _load_programs(user_id)
+    if programs is None:
         return []
-    with open(path) as f:
-        programs = json.load(f)
     # Backfill any programs with missing/empty IDs
     changed = False
     for p in programs:
@@ -628,70 +781,83 @@ async def get_programs(user_id: str):
             p["id"] = str(uuid.uuid4())[:8]
             changed = True
     if changed:
-        with open(path, "w") as f:
-            json.dump(programs, f, indent=2)
+        _save_programs(user_id, programs)
     return programs
 
 @app.post("/api/users/{user_id}/programs")
 async def save_program(user_id: str, request: Request):
     body = await request.json()
-    path = user_dir(user_id) / "programs.json"
-    path.parent.mkdir(parents=True, exist_ok=True)
-
-    programs = []
-    if path.exists():
-        with open(path) as f:
-            programs = json.load(f)
+    programs = _load_programs(user_id) or []
 
     # Upsert by id — ensure non-empty ID
     prog_id = body.get("id") or str(uuid.uuid4())[:8]
     body["id"] = prog_id
-    programs = [p for p in programs if p.get("id") != prog_id]
+    existing = json_cache.index(_programs_path(user_id), programs).get(prog_id)
+    if existing is not None:
+        programs.remove(existing)
     programs.append(body)
 
-    with open(path, "w") as f:
-        json.dump(programs, f, indent=2)
+    _save_programs(user_id, programs)
 
     return body
 
 @app.delete("/api/users/{user_id}/programs/{program_id}")
 async def delete_program(user_id: str, program_id: str):
-    path = user_dir(user_id) / "programs.json"
-    if not path.exists():
+    programs = _load_programs(user_id)
+    if programs is None:
         raise HTTPException(404)
 
-    with open(path) as f:
-        programs = json.load(f)
-    programs = [p for p in programs if p.get("id") != program_id]
-    with open(path, "w") as f:
-        json.dump(programs, f, indent=2)
+    program = json_cache.index(_programs_path(user_id), programs).get(program_id)
+    if program is not None:
+        programs.remove(program)
+        _save_programs(user_id, programs)
 
     return {"ok": True}
 
 # ---------------------------------------------------------------------------
 # Workouts endpoints
 # ---------------------------------------------------------------------------
+def _workouts_path(user_id: str) -> Path:
+    return user_dir(user_id) / "workouts.jsonl"
+
 def _load_workouts(user_id: str) -> List[Dict]:
-    path = user_dir(user_id) / "workouts.json"
-    if not path.exists():
+    workouts = json_cache.load(_workouts_path(user_id), None, load_jsonl)
+    if workouts is None:
+        workouts = _migrate_workouts(user_id)
+    return workouts
+
+def _migrate_workouts(user_id: str) -> List[Dict]:
+    """Convert a legacy workouts.json array into workouts.jsonl."""
+    legacy = user_dir(user_id) / "workouts.json"
+    try:
+        workouts = orjson.loads(legacy.read_bytes())
+    except FileNotFoundError:
         return []
-    with open(path) as f:
-        return json.load(f)
+    # Written synchronously (not via the background writer) and kept as a
+    # .bak: the legacy file must outlive any failed or unfinished write.
+    path = _workouts_path(user_id)
+    write_file(path, dump_jsonl(workouts), "wb")
+    legacy.replace(legacy.with_name("workouts.json.bak"))
+    return json_cache.load(path, [], load_jsonl)
+
+def _get_workout(user_id: str, workout_id: str) -> Optional[Dict]:
+    return json_cache.index(_workouts_path(user_id), _load_workouts(user_id)).get(workout_id)
 
 def _save_workouts(user_id: str, workouts: List[Dict]):
-    path = user_dir(user_id) / "workouts.json"
+    path = _workouts_path(user_id)
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(workouts, f, indent=2)
+    json_cache.store(path, workouts, dump_jsonl)
 
 def _save_workout(workout: Dict):
     """Save a single workout (append to user's list)."""
     uid = workout.get("user_id")
     if not uid:
         return
-    workouts = _load_workouts(uid)
-    workouts.append(workout)
-    _save_workouts(uid, workouts)
+    # Loading first migrates a legacy file and lets the append update the cache.
+    _load_workouts(uid)
+    path = _workouts_path(uid)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_cache.append_line(path, workout)
 
 @app.get("/api/users/{user_id}/workouts")
 async def get_workouts(user_id: str):
@@ -699,21 +865,21 @@ async def get_workouts(user_id: str):
 
 @app.delete("/api/users/{user_id}/workouts/{workout_id}")
 async def delete_workout(user_id: str, workout_id: str):
-    workouts = _load_workouts(user_id)
-    workouts = [w for w in workouts if w.get("id") != workout_id]
-    _save_workouts(user_id, workouts)
+    workout = _get_workout(user_id, workout_id)
+    if workout is not None:
+        workouts = _load_workouts(user_id)
+        workouts.remove(workout)
+        _save_workouts(user_id, workouts)
     return {"ok": True}
 
 @app.get("/api/users/{user_id}/workouts/{workout_id}/export")
 async def export_workout(user_id: str, workout_id: str):
-    workouts = _load_workouts(user_id)
-    workout = next((w for w in workouts if w.get("id") == workout_id), None)
+    workout = _get_workout(user_id, workout_id)
     if not workout:
         raise HTTPException(404, "Workout not found")
 
-    tcx_content = tcx_module.generate_tcx(workout)
-    return Response(
-        content=tcx_content,
+    return StreamingResponse(
+        tcx_module.generate_tcx_iter(workout),
         media_type="application/xml",
         headers={"Content-Disposition": f'attachment; filename="workout_{workout_id}.tcx"'},
     )
@@ -723,10 +889,10 @@ async def export_workout(user_id: str, workout_id: str):
 # ---------------------------------------------------------------------------
 @app.get("/api/users/{user_id}/settings")
 async def get_user_settings(user_id: str):
-    settings = strava_module.load_user_settings(user_id)
+    settings = await strava_module.aload_user_settings(user_id)
     safe = {
         "strava_client_id": settings.get("strava_client_id", ""),
-        "strava_connected": strava_module.is_connected(user_id),
+        "strava_connected": await strava_module.ais_connected(user_id),
         "weight_kg": settings.get("weight_kg", 75),
     }
     return safe
@@ -734,14 +900,19 @@ async def get_user_settings(user_id: str):
 @app.post("/api/users/{user_id}/settings")
 async def update_user_settings(user_id: str, request: Request):
     body = await request.json()
-    settings = strava_module.load_user_settings(user_id)
+    # Copy: the loaded dict is the cached one, and float() below may raise
+    settings = dict(await strava_module.aload_user_settings(user_id))
     if "strava_client_id" in body:
         settings["strava_client_id"] = body["strava_client_id"]
     if "strava_client_secret" in body:
         settings["strava_client_secret"] = body["strava_client_secret"]
     if "weight_kg" in body:
         settings["weight_kg"] = float(body["weight_kg"])
-    strava_module.save_user_settings(user_id, settings)
+    await strava_module.asave_user_settings(user_id, settings)
+
+    recorder = request.app.state.pool.recorder
+    if recorder.active_user_id == user_id:
+        recorder.user_weight_kg = settings.get("weight_kg", 75.0)
     return {"ok": True}
 
 @app.get("/api/users/{user_id}/strava/auth")
@@ -770,12 +941,11 @@ async def strava_callback(code: str, state: str, scope: str = ""):
 
 @app.post("/api/users/{user_id}/workouts/{workout_id}/strava")
 async def upload_to_strava(user_id: str, workout_id: str):
-    workouts = _load_workouts(user_id)
-    workout = next((w for w in workouts if w.get("id") == workout_id), None)
+    workout = _get_workout(user_id, workout_id)
     if not workout:
         raise HTTPException(404, "Workout not found")
 
-    tcx_content = tcx_module.generate_tcx(workout)
+    tcx_data = tcx_module.generate_tcx_bytes(workout)
 
     dist = workout.get("total_distance", 0)
     dur = workout.get("total_time", 0)
@@ -786,21 +956,29 @@ async def upload_to_strava(user_id: str, workout_id: str):
     name = f"{prefix}{label} – {dist:.0f}m in {format_timer(dur)}"
 
     try:
-        result = await strava_module.upload_tcx(user_id, tcx_content, name)
+        result = await strava_module.upload_tcx(user_id, tcx_data, name)
     except Exception as e:
         raise HTTPException(500, f"Strava upload failed: {e}")
 
-    activity_id = result.get("activity_id")
-    if activity_id:
-        return {
-            "ok": True,
-            "activity_id": activity_id,
-            "url": f"https://www.strava.com/activities/{activity_id}",
-        }
-    elif result.get("error"):
+    if result.get("error"):
         raise HTTPException(500, f"Strava error: {result['error']}")
-    else:
-        return {"ok": True, "status": "processing", "upload_id": result.get("id")}
+    return {"ok": True, "status": "processing", "upload_id": result.get("id")}
+
+
+@app.get("/api/users/{user_id}/uploads/{upload_id}")
+async def get_strava_upload(user_id: str, upload_id: str):
+    upload = (await strava_module.aload_pending_uploads(user_id)).get(upload_id)
+    if not upload:
+        raise HTTPException(404, "Upload not found")
+
+    result = {"ok": True, "upload_id": upload_id, "status": upload["status"]}
+    activity_id = upload.get("activity_id")
+    if activity_id:
+        result["activity_id"] = activity_id
+        result["url"] = f"https://www.strava.com/activities/{activity_id}"
+    if upload.get("error"):
+        result["error"] = upload["error"]
+    return result
 
 # ---------------------------------------------------------------------------
 # Default training programs
@@ -900,11 +1078,63 @@ def _default_programs() -> List[Dict]:
         },
     ]
 
+# Written verbatim for every new user; the defaults never change at runtime.
+_DEFAULT_PROGRAMS_JSON = dump_json(_default_programs())
+
 # ---------------------------------------------------------------------------
 # Static files (must be last)
 # ---------------------------------------------------------------------------
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+_HASHED_ASSET = re.compile(r"\.[0-9a-f]{8,}\.(?:js|css|png|svg|woff2?)$")
+
+
+class CachingStaticFiles(StaticFiles):
+    """StaticFiles with explicit Cache-Control.
+
+    Content-hashed asset names never change contents, so browsers may keep
+    them forever. Everything else (index.html, app.js, style.css) must be
+    revalidated, which costs a 304 via ETag/Last-Modified instead of a
+    heuristic-fresh stale copy after an add-on update.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _HASHED_ASSET.search(str(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+app.mount("/", CachingStaticFiles(directory="static", html=True), name="static")
+
+def _raise_nofile_limit():
+    """Lift the soft open-file limit to the hard limit.
+
+    Every WebSocket tab holds a descriptor; container defaults of 1024 are
+    the first ceiling hit when the UI is open on many devices.
+    """
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = 65536 if hard == resource.RLIM_INFINITY else hard
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
+    _raise_nofile_limit()
+    # uvloop + httptools come with uvicorn[standard]; pin them so a missing
+    # extra fails loudly instead of silently falling back to asyncio/h11.
+    # A single worker: pool status and the workout recorder live in-process.
+    uvicorn.run(
+        "server:app", host="0.0.0.0", port=8000,
+        loop="uvloop", http="httptools", workers=1,
+        # Status frames are ~300 bytes; deflating them costs more than it saves.
+        ws_per_message_deflate=False,
+    )
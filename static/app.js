@@ -941,11 +941,20 @@ function exportWorkout(id) {
 async function uploadStrava(id) {
     try {
         const resp = await fetch(`/api/users/${currentUser.id}/workouts/${id}/strava`, {method: 'POST'});
-        const result = await resp.json();
+        let result = await resp.json();
+        // Strava processes uploads in the background; check back for up to ~15 s
+        for (let delay = 1000; result.status === 'processing' && result.upload_id && delay <= 8000; delay *= 2) {
+            await new Promise(r => setTimeout(r, delay));
+            const poll = await fetch(`/api/users/${currentUser.id}/uploads/${result.upload_id}`);
+            if (!poll.ok) break;
+            result = await poll.json();
+        }
         if (result.url) {
             alert('Uploaded to Strava!\n' + result.url);
         } else if (result.status === 'processing') {
             alert('Upload submitted. It may take a moment to appear on Strava.');
+        } else if (result.error) {
+            alert('Strava error: ' + result.error);
         } else {
             alert('Upload issue: ' + JSON.stringify(result));
         }
@@ -8,57 +8,171 @@ Flow:
 4. Upload TCX files via POST /api/v3/uploads
 """
 
-import json
+import asyncio
+import logging
 import os
+import threading
 import time
+from functools import cache
 from pathlib import Path
-from typing import Optional, Dict, Any
-from urllib.parse import urlencode
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import quote_plus
 
 import httpx
+import orjson
+
+from jsoncache import json_cache
+
+logger = logging.getLogger(__name__)
 
 STRAVA_AUTH_URL = "https://www.strava.com/oauth/authorize"
 STRAVA_TOKEN_URL = "https://www.strava.com/oauth/token"
 STRAVA_UPLOAD_URL = "https://www.strava.com/api/v3/uploads"
 STRAVA_UPLOAD_STATUS_URL = "https://www.strava.com/api/v3/uploads/{upload_id}"
+# Authorization URL with the fixed parameters pre-encoded (same order and
+# escaping as urlencode); only client_id, redirect_uri and state vary.
+_AUTH_URL_TEMPLATE = (
+    STRAVA_AUTH_URL
+    + "?client_id={client_id}&redirect_uri={redirect_uri}&response_type=code"
+    + "&scope=activity%3Awrite&state={state}&approval_prompt=auto"
+)
+UPLOAD_POLL_TIMEOUT = 300.0  # seconds to wait for Strava to process an upload
+UPLOAD_RESULT_TTL = 86400.0  # seconds to keep finished uploads for the status poll
+
+# One keep-alive connection pool for all Strava calls, so token refresh,
+# upload and status polling don't each pay a TCP+TLS handshake.  HTTP/2 lets
+# concurrent uploads and polls share a single connection.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=5, max_connections=10, keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(15.0),
+        )
+    return _client
+
+
+async def aclose_client():
+    """Close the shared HTTP client and stop upload polling; called on app shutdown."""
+    global _client
+    for task in _pollers.values():
+        task.cancel()
+    _pollers.clear()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@cache
+def _data_root() -> Path:
+    """Data directory, read from the environment once (cache_clear() to re-read)."""
+    return Path(os.environ.get("ENDLESSPOOL_DATA_DIR", "data"))
 
 
 def get_user_data_dir(user_id: str) -> Path:
-    return Path(os.environ.get("ENDLESSPOOL_DATA_DIR", "data")) / "users" / user_id
+    return _data_root() / "users" / user_id
+
+
+# Settings/token files go through the shared mtime-keyed JSON cache, so both
+# modules see the same parsed copy of settings.json.
+def _load_json(path: Path) -> Optional[Dict[str, Any]]:
+    return json_cache.load(path, None)
+
+
+def _save_json(path: Path, data: Dict[str, Any]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_cache.store(path, data)
 
 
 def load_strava_tokens(user_id: str) -> Optional[Dict[str, Any]]:
     """Load stored Strava tokens for a user."""
-    path = get_user_data_dir(user_id) / "strava.json"
-    if not path.exists():
-        return None
-    with open(path) as f:
-        return json.load(f)
+    return _load_json(get_user_data_dir(user_id) / "strava.json")
 
 
 def save_strava_tokens(user_id: str, tokens: Dict[str, Any]):
     """Save Strava tokens for a user."""
-    path = get_user_data_dir(user_id) / "strava.json"
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(tokens, f, indent=2)
+    _save_json(get_user_data_dir(user_id) / "strava.json", tokens)
+    _cache_token(user_id, tokens)
+
+
+# Valid access tokens: user_id -> (expires_at, access_token), so the common
+# case of an unexpired token needs no file access at all.
+_token_cache: Dict[str, Tuple[float, str]] = {}
+
+
+def _cache_token(user_id: str, tokens: Dict[str, Any]):
+    if "access_token" in tokens:
+        _token_cache[user_id] = (tokens.get("expires_at", 0), tokens["access_token"])
+
+
+def drop_cached_tokens(user_id: str):
+    """Forget a user's in-memory access token (e.g. when the user is deleted)."""
+    _token_cache.pop(user_id, None)
 
 
 def load_user_settings(user_id: str) -> Dict[str, Any]:
     """Load user settings (contains Strava client_id/client_secret)."""
-    path = get_user_data_dir(user_id) / "settings.json"
-    if not path.exists():
-        return {}
-    with open(path) as f:
-        return json.load(f)
+    settings = _load_json(get_user_data_dir(user_id) / "settings.json")
+    return settings if settings is not None else {}
 
 
 def save_user_settings(user_id: str, settings: Dict[str, Any]):
     """Save user settings."""
-    path = get_user_data_dir(user_id) / "settings.json"
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(settings, f, indent=2)
+    _save_json(get_user_data_dir(user_id) / "settings.json", settings)
+
+
+# Submitted uploads, keyed by Strava upload id, so processing results can be
+# polled in the background and survive a restart.
+_pending_lock = threading.Lock()
+
+
+def load_pending_uploads(user_id: str) -> Dict[str, Any]:
+    """Load the user's upload queue: {upload_id: {"name", "submitted", "status", ...}}."""
+    uploads = _load_json(get_user_data_dir(user_id) / "pending_uploads.json")
+    return uploads if uploads is not None else {}
+
+
+def _update_upload(user_id: str, upload_id: str, **fields) -> Dict[str, Any]:
+    """Merge fields into one queued upload and write the queue back."""
+    with _pending_lock:
+        now = time.time()
+        uploads = {
+            k: u for k, u in load_pending_uploads(user_id).items()
+            if u.get("status") == "processing"
+            or now - u.get("submitted", 0) < UPLOAD_RESULT_TTL
+        }
+        entry = uploads[upload_id] = {**uploads.get(upload_id, {}), **fields}
+        _save_json(get_user_data_dir(user_id) / "pending_uploads.json", uploads)
+        return entry
+
+
+# Async variants for coroutine callers: disk reads/writes run in a worker
+# thread so a slow SD card doesn't stall the event loop.
+async def aload_strava_tokens(user_id: str) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(load_strava_tokens, user_id)
+
+
+async def asave_strava_tokens(user_id: str, tokens: Dict[str, Any]):
+    await asyncio.to_thread(save_strava_tokens, user_id, tokens)
+
+
+async def aload_pending_uploads(user_id: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(load_pending_uploads, user_id)
+
+
+async def aload_user_settings(user_id: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(load_user_settings, user_id)
+
+
+async def asave_user_settings(user_id: str, settings: Dict[str, Any]):
+    await asyncio.to_thread(save_user_settings, user_id, settings)
 
 
 def get_auth_url(user_id: str, redirect_uri: str) -> Optional[str]:
@@ -71,37 +185,32 @@ def get_auth_url(user_id: str, redirect_uri: str) -> Optional[str]:
     if not client_id:
         return None
 
-    params = {
-        "client_id": client_id,
-        "redirect_uri": redirect_uri,
-        "response_type": "code",
-        "scope": "activity:write",
-        "state": user_id,
-        "approval_prompt": "auto",
-    }
-    return f"{STRAVA_AUTH_URL}?{urlencode(params)}"
+    return _AUTH_URL_TEMPLATE.format(
+        client_id=quote_plus(str(client_id), safe=""),
+        redirect_uri=quote_plus(redirect_uri, safe=""),
+        state=quote_plus(user_id, safe=""),
+    )
 
 
 async def exchange_token(user_id: str, code: str) -> Dict[str, Any]:
     """Exchange an authorization code for access + refresh tokens."""
-    settings = load_user_settings(user_id)
+    settings = await aload_user_settings(user_id)
     client_id = settings.get("strava_client_id")
     client_secret = settings.get("strava_client_secret")
 
     if not client_id or not client_secret:
         raise ValueError("Strava client_id and client_secret not configured")
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(STRAVA_TOKEN_URL, data={
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "code": code,
-            "grant_type": "authorization_code",
-        })
-        resp.raise_for_status()
-        tokens = resp.json()
-
-    save_strava_tokens(user_id, tokens)
+    resp = await get_client().post(STRAVA_TOKEN_URL, data={
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "code": code,
+        "grant_type": "authorization_code",
+    })
+    resp.raise_for_status()
+    tokens = orjson.loads(resp.content)
+
+    await asave_strava_tokens(user_id, tokens)
     return tokens
 
 
@@ -110,99 +219,196 @@ async def refresh_token_if_needed(user_id: str) -> Optional[str]:
     Get a valid access token, refreshing if expired.
     Returns the access token or None if not connected.
     """
-    tokens = load_strava_tokens(user_id)
+    # Check if token is expired (with 60s buffer)
+    cached = _token_cache.get(user_id)
+    if cached and time.time() < cached[0] - 60:
+        return cached[1]
+
+    tokens = await aload_strava_tokens(user_id)
     if not tokens:
         return None
 
-    # Check if token is expired (with 60s buffer)
     expires_at = tokens.get("expires_at", 0)
     if time.time() < expires_at - 60:
+        _cache_token(user_id, tokens)
         return tokens["access_token"]
 
     # Refresh the token
-    settings = load_user_settings(user_id)
+    settings = await aload_user_settings(user_id)
     client_id = settings.get("strava_client_id")
     client_secret = settings.get("strava_client_secret")
 
     if not client_id or not client_secret:
         return None
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(STRAVA_TOKEN_URL, data={
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "refresh_token": tokens["refresh_token"],
-            "grant_type": "refresh_token",
-        })
-        if resp.status_code != 200:
-            return None
-        new_tokens = resp.json()
-
-    # Merge new tokens (keep athlete info etc)
-    tokens.update(new_tokens)
-    save_strava_tokens(user_id, tokens)
+    resp = await get_client().post(STRAVA_TOKEN_URL, data={
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "refresh_token": tokens["refresh_token"],
+        "grant_type": "refresh_token",
+    })
+    if resp.status_code != 200:
+        return None
+    new_tokens = orjson.loads(resp.content)
+
+    # Merge new tokens (keep athlete info etc) into a copy: the loaded dict
+    # is the cached one, which must only change once the save succeeds.
+    tokens = {**tokens, **new_tokens}
+    await asave_strava_tokens(user_id, tokens)
     return tokens["access_token"]
 
 
-async def upload_tcx(user_id: str, tcx_content: str, name: str,
+async def upload_tcx(user_id: str, tcx_data: bytes, name: str,
                      description: str = "") -> Dict[str, Any]:
     """
     Upload a TCX file to Strava.
 
-    Returns upload status dict with 'id', 'status', 'activity_id' etc.
+    Returns Strava's initial upload status dict with 'id', 'status' etc.;
+    processing is then tracked in the background (see load_pending_uploads).
     Raises on error.
     """
     access_token = await refresh_token_if_needed(user_id)
     if not access_token:
         raise ValueError("Not connected to Strava. Please connect first.")
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            STRAVA_UPLOAD_URL,
-            headers={"Authorization": f"Bearer {access_token}"},
-            files={"file": ("workout.tcx", tcx_content.encode(), "application/xml")},
-            data={
-                "data_type": "tcx",
-                "name": name,
-                "description": description,
-            },
-        )
-        resp.raise_for_status()
-        upload_result = resp.json()
-
-    # Poll for completion
+    resp = await get_client().post(
+        STRAVA_UPLOAD_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+        files={"file": ("workout.tcx", tcx_data, "application/xml")},
+        data={
+            "data_type": "tcx",
+            "name": name,
+            "description": description,
+        },
+    )
+    resp.raise_for_status()
+    upload_result = orjson.loads(resp.content)
+
+    # Strava processes the file asynchronously; queue it for the background
+    # poller instead of holding the request open until it's done.
     upload_id = upload_result.get("id")
     if upload_id:
-        for _ in range(30):  # Max 30 seconds
-            await _async_sleep(1)
-            status = await _check_upload_status(access_token, upload_id)
-            if status.get("activity_id"):
-                return status
-            if status.get("error"):
-                return status
+        await asyncio.to_thread(
+            _update_upload, user_id, str(upload_id),
+            name=name, submitted=time.time(), status="processing",
+        )
+        _start_poller(user_id)
 
     return upload_result
 
 
-async def _check_upload_status(access_token: str, upload_id: int) -> Dict[str, Any]:
-    """Check the status of a Strava upload."""
-    url = STRAVA_UPLOAD_STATUS_URL.format(upload_id=upload_id)
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            url,
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
-        resp.raise_for_status()
-        return resp.json()
+# Background pollers: user_id -> task (at most one per user)
+_pollers: Dict[str, asyncio.Task] = {}
+# Users whose queue changed since their poller last read it
+_poll_again: set = set()
+
+
+def _start_poller(user_id: str):
+    _poll_again.add(user_id)
+    task = _pollers.get(user_id)
+    if task is None or task.done():
+        _pollers[user_id] = asyncio.create_task(_poll_pending(user_id))
+
+
+def resume_pending_uploads():
+    """Restart polling for uploads still processing when the app last stopped."""
+    for path in (_data_root() / "users").glob("*/pending_uploads.json"):
+        user_id = path.parent.name
+        uploads = load_pending_uploads(user_id)
+        if any(u.get("status") == "processing" for u in uploads.values()):
+            _start_poller(user_id)
 
 
-async def _async_sleep(seconds: float):
-    """Async sleep helper."""
-    import asyncio
-    await asyncio.sleep(seconds)
+async def _poll_pending(user_id: str):
+    """
+    Poll Strava until none of the user's uploads are still processing,
+    backing off 0.5, 1, 2, 4, 8, 8... s between rounds.
+    """
+    delay = 0.5
+    while True:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 8.0)
+
+        _poll_again.discard(user_id)
+        try:
+            uploads = await aload_pending_uploads(user_id)
+        except Exception:
+            # Nothing can be marked without the queue; the next upload or a
+            # restart starts a fresh poller.
+            logger.exception("Could not read upload queue for user %s", user_id)
+            return
+        pending = [(k, u) for k, u in uploads.items() if u.get("status") == "processing"]
+        if not pending:
+            # An upload queued while the read was in flight still needs a round
+            if user_id in _poll_again:
+                continue
+            return
+
+        # Network errors are retried next round; anything else (bad JSON,
+        # broken token file, disk errors) fails the affected uploads.
+        try:
+            access_token = await refresh_token_if_needed(user_id)
+        except httpx.HTTPError:
+            access_token = None
+        except Exception as e:
+            logger.exception("Strava token refresh failed for user %s", user_id)
+            for upload_id, _ in pending:
+                await _fail_upload(user_id, upload_id, f"Token refresh failed: {e}")
+            continue
+
+        for upload_id, upload in pending:
+            try:
+                await _poll_upload(user_id, access_token, upload_id, upload)
+            except Exception as e:
+                logger.exception("Polling Strava upload %s failed", upload_id)
+                await _fail_upload(user_id, upload_id, f"Polling failed: {e}")
+
+
+async def _poll_upload(user_id: str, access_token: Optional[str], upload_id: str,
+                       upload: Dict[str, Any]):
+    """Check one queued upload and record its result once it's final."""
+    status: Dict[str, Any] = {}
+    if access_token:
+        try:
+            status = await _check_upload_status(access_token, upload_id)
+        except httpx.HTTPError:
+            pass
+    if status.get("activity_id"):
+        fields = {"status": "ready", "activity_id": status["activity_id"]}
+    elif status.get("error"):
+        fields = {"status": "error", "error": status["error"]}
+    elif time.time() - upload.get("submitted", 0) > UPLOAD_POLL_TIMEOUT:
+        fields = {"status": "error", "error": "Timed out waiting for Strava"}
+    else:
+        return
+    await asyncio.to_thread(_update_upload, user_id, upload_id, **fields)
+
+
+async def _fail_upload(user_id: str, upload_id: str, error: str):
+    """Mark a queued upload as failed, logging if even that can't be saved."""
+    try:
+        await asyncio.to_thread(_update_upload, user_id, upload_id, status="error", error=error)
+    except Exception:
+        logger.exception("Could not record failure of Strava upload %s", upload_id)
+
+
+async def _check_upload_status(access_token: str, upload_id: str) -> Dict[str, Any]:
+    """Check the status of a Strava upload."""
+    url = STRAVA_UPLOAD_STATUS_URL.format(upload_id=upload_id)
+    resp = await get_client().get(
+        url,
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    resp.raise_for_status()
+    return orjson.loads(resp.content)
 
 
 def is_connected(user_id: str) -> bool:
     """Check if user has Strava tokens stored."""
     tokens = load_strava_tokens(user_id)
     return tokens is not None and "access_token" in tokens
+
+
+async def ais_connected(user_id: str) -> bool:
+    tokens = await aload_strava_tokens(user_id)
+    return tokens is not None and "access_token" in tokens
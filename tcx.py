@@ -4,14 +4,57 @@ TCX (Training Center XML) file generator for swimming workouts.
 Generates TCX v2 files compatible with Garmin Connect, Strava, and TrainingPeaks.
 """
 
-import xml.etree.ElementTree as ET
+from bisect import bisect_left
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional
+
+TCX_NS = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+# Fixed document fragments, built once at import time
+_HEADER = (
+    "<?xml version='1.0' encoding='utf-8'?>\n"
+    f'<TrainingCenterDatabase xmlns="{TCX_NS}" xmlns:xsi="{XSI_NS}"'
+    f' xsi:schemaLocation="{TCX_NS} http://www.garmin.com/xmlschemas/TrainingCenterDatabasev2.xsd">'
+    '<Activities><Activity Sport="Other">'  # Stationary pool swimming
+)
+_FOOTER = (
+    '<Creator xsi:type="Device_t">'
+    "<Name>Endless Pool Controller</Name>"
+    "<UnitId>0</UnitId>"
+    "<ProductID>0</ProductID>"
+    "<Version><VersionMajor>1</VersionMajor><VersionMinor>0</VersionMinor></Version>"
+    "</Creator>"
+    "</Activity></Activities></TrainingCenterDatabase>"
+)
+_LAP_TRAILER = "<Intensity>Active</Intensity><TriggerMethod>Manual</TriggerMethod><Track>"
+_LAP_END = "</Track></Lap>"
+# Bound %-format of one trackpoint: (date, hour, minute, second, distance)
+_TRACKPOINT = (
+    "<Trackpoint><Time>%sT%02d:%02d:%02d.000Z</Time>"
+    "<DistanceMeters>%.1f</DistanceMeters></Trackpoint>"
+).__mod__
 
 
 def generate_tcx(workout: Dict[str, Any]) -> str:
+    """Generate a TCX XML string from a workout record (see generate_tcx_iter)."""
+    out: List[str] = []
+    for _ in _write_tcx(workout, out):
+        pass
+    return "".join(out)
+
+
+def generate_tcx_bytes(workout: Dict[str, Any]) -> bytes:
+    """Generate the TCX document as UTF-8 bytes, ready to upload."""
+    return generate_tcx(workout).encode("utf-8")
+
+
+def generate_tcx_iter(workout: Dict[str, Any]) -> Iterator[bytes]:
     """
-    Generate a TCX XML string from a workout record.
+    Generate a TCX document as UTF-8 chunks: the header, one per lap, then
+    the footer.  Only one lap is held in memory at a time, so the result can
+    be streamed straight into an HTTP response.
 
     Workout format:
     {
@@ -33,36 +76,35 @@ def generate_tcx(workout: Dict[str, Any]) -> str:
         ]
     }
     """
-    ns = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
-    ET.register_namespace("", ns)
+    out: List[str] = []
+    for _ in _write_tcx(workout, out):
+        yield "".join(out).encode("utf-8")
+        out.clear()
 
-    root = ET.Element("TrainingCenterDatabase")
-    root.set("xmlns", ns)
-    root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
-    root.set("xsi:schemaLocation",
-             f"{ns} http://www.garmin.com/xmlschemas/TrainingCenterDatabasev2.xsd")
 
-    activities = ET.SubElement(root, "Activities")
-    activity = ET.SubElement(activities, "Activity")
-    activity.set("Sport", "Other")  # Stationary pool swimming
+def _write_tcx(workout: Dict[str, Any], out: List[str]) -> Iterator[None]:
+    """Append the TCX document to *out* in a single pass.
 
+    Yields after the header and after each lap, so a caller can flush what
+    has been written so far.
+    """
     start_time = workout.get("start_time", datetime.now(timezone.utc).isoformat())
     if isinstance(start_time, str):
-        try:
-            start_dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-        except ValueError:
-            start_dt = datetime.now(timezone.utc)
+        start_dt = _parse_iso(start_time) or datetime.now(timezone.utc)
     else:
         start_dt = start_time
 
-    ET.SubElement(activity, "Id").text = start_dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    out.append(_HEADER)
+    out.append(f'<Id>{start_dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")}</Id>')
+    yield
 
     intervals = workout.get("intervals", [])
 
     if not intervals:
         # Single lap for the whole workout
-        _add_lap(activity, start_dt, workout.get("total_time", 0),
-                 workout.get("total_distance", 0.0))
+        _write_lap(out, start_dt, workout.get("total_time", 0),
+                   workout.get("total_distance", 0.0))
+        yield
     else:
         cumulative_dist = 0.0
         for interval in intervals:
@@ -74,68 +116,77 @@ def generate_tcx(workout: Dict[str, Any]) -> str:
 
             int_start_str = interval.get("start_time", start_dt.isoformat())
             if isinstance(int_start_str, str):
-                try:
-                    int_start = datetime.fromisoformat(
-                        int_start_str.replace("Z", "+00:00"))
-                except ValueError:
-                    int_start = start_dt
+                int_start = _parse_iso(int_start_str) or start_dt
             else:
                 int_start = int_start_str
 
-            _add_lap(activity, int_start, duration, distance,
-                     cumulative_dist_start=cumulative_dist)
+            _write_lap(out, int_start, duration, distance,
+                       cumulative_dist_start=cumulative_dist)
+            yield
             cumulative_dist += distance
 
-    # Creator
-    creator = ET.SubElement(activity, "Creator")
-    creator.set("xsi:type", "Device_t")
-    ET.SubElement(creator, "Name").text = "Endless Pool Controller"
-    ET.SubElement(creator, "UnitId").text = "0"
-    ET.SubElement(creator, "ProductID").text = "0"
-    version = ET.SubElement(creator, "Version")
-    ET.SubElement(version, "VersionMajor").text = "1"
-    ET.SubElement(version, "VersionMinor").text = "0"
+    out.append(_FOOTER)
+    yield
 
-    tree = ET.ElementTree(root)
-    import io
-    buf = io.BytesIO()
-    tree.write(buf, encoding="utf-8", xml_declaration=True)
-    return buf.getvalue().decode("utf-8")
 
+@lru_cache(maxsize=1024)
+def _parse_iso(value: str) -> Optional[datetime]:
+    """Parse an ISO-8601 timestamp (trailing "Z" allowed), or None if invalid."""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
 
-def _add_lap(activity: ET.Element, start_dt: datetime, duration: int,
-             distance: float, cumulative_dist_start: float = 0.0):
-    """Add a Lap element with trackpoints."""
-    lap = ET.SubElement(activity, "Lap")
-    lap.set("StartTime", start_dt.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
 
-    ET.SubElement(lap, "TotalTimeSeconds").text = str(duration)
-    ET.SubElement(lap, "DistanceMeters").text = f"{distance:.1f}"
+def _write_lap(parts: List[str], start_dt: datetime, duration: int,
+               distance: float, cumulative_dist_start: float = 0.0):
+    """Append one Lap element with its trackpoints.
 
-    if duration > 0 and distance > 0:
-        max_speed = distance / duration  # m/s
-        ET.SubElement(lap, "MaximumSpeed").text = f"{max_speed:.3f}"
+    Written directly as text: every value is a timestamp or a number, so
+    nothing needs XML escaping.
+    """
+    append = parts.append
+    tp = _TRACKPOINT
+
+    # Timestamps below are built from the lap's date and wall-clock second
+    # of day with integer arithmetic rather than a strftime call each.
+    day0 = start_dt.date()
+    sod0 = start_dt.hour * 3600 + start_dt.minute * 60 + start_dt.second
+    append(
+        f'<Lap StartTime="{day0.isoformat()}T{start_dt.hour:02d}:'
+        f'{start_dt.minute:02d}:{start_dt.second:02d}.000Z">'
+    )
+    append(f"<TotalTimeSeconds>{duration}</TotalTimeSeconds>")
+    append(f"<DistanceMeters>{distance:.1f}</DistanceMeters>")
+
+    dist_per_sec = distance / duration if duration > 0 else 0.0  # m/s
+    if dist_per_sec > 0:
+        append(f"<MaximumSpeed>{dist_per_sec:.3f}</MaximumSpeed>")
 
     # Rough calorie estimate: ~7 cal/min for moderate swimming
     calories = int(duration / 60 * 7)
-    ET.SubElement(lap, "Calories").text = str(calories)
-
-    ET.SubElement(lap, "Intensity").text = "Active"
-    ET.SubElement(lap, "TriggerMethod").text = "Manual"
-
-    # Generate trackpoints every 5 seconds
-    track = ET.SubElement(lap, "Track")
-    num_points = max(2, duration // 5 + 1)
-    for i in range(num_points):
-        t = min(i * 5, duration)
-        tp = ET.SubElement(track, "Trackpoint")
-        tp_time = start_dt + timedelta(seconds=t)
-        ET.SubElement(tp, "Time").text = tp_time.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-
-        # Cumulative distance at this trackpoint
-        if duration > 0:
-            frac = t / duration
-        else:
-            frac = 0
-        cum_dist = cumulative_dist_start + distance * frac
-        ET.SubElement(tp, "DistanceMeters").text = f"{cum_dist:.1f}"
+    append(f"<Calories>{calories}</Calories>")
+
+    append(_LAP_TRAILER)
+
+    # Generate trackpoints every 5 seconds, rendered as one batch per
+    # calendar day (a lap only spans two if it runs past midnight).
+    if duration < 5:
+        # Too short for a 5 s step: just the start and end points
+        times = [0, duration]
+    else:
+        times = range(0, duration + 1, 5)
+    num_points = len(times)
+    first = 0
+    day = 0
+    while first < num_points:
+        last = bisect_left(times, (day + 1) * 86400 - sod0, first)
+        date_str = (day0 + timedelta(days=day)).isoformat()
+        base = sod0 - day * 86400
+        append("".join([
+            tp((date_str, s // 3600, s // 60 % 60, s % 60, cumulative_dist_start + dist_per_sec * t))
+            for t in times[first:last] for s in (base + t,)
+        ]))
+        first = last
+        day += 1
+    append(_LAP_END)